@@ -7,12 +7,18 @@ downloaded or displayed in the UI.
 """
 
 import os
+import re
+import threading
+import uuid
+from collections import deque
+from itertools import islice
 import streamlit as st
 from pathlib import Path
+from typing import Optional
 from dotenv import load_dotenv
 
 # Import our custom modules
-from utils.azure_agent import create_agent_from_env
+from utils.azure_agent import AzureAgentManager, create_agent_from_env
 from utils.file_handler import (
     download_files,
     get_file_display_name,
@@ -20,6 +26,8 @@ from utils.file_handler import (
     get_mime_type,
     cleanup_old_files
 )
+from utils.session_store import load_thread_id, save_thread_id, clear_thread_id
+from utils.log_config import configure_logging
 
 # Load environment variables
 load_dotenv()
@@ -41,43 +49,150 @@ SAMPLE_PROMPTS = [
     "Create a CSV file with 10 rows of sample customer data (name, email, purchase_amount)",
 ]
 
+# (prompt, shorter button label) pairs, built once at import
+SAMPLE_PROMPT_LABELS = [
+    (prompt, prompt[:50] + "..." if len(prompt) > 50 else prompt)
+    for prompt in SAMPLE_PROMPTS
+]
+
+# Chat history limits: messages kept in the session, and messages replayed per rerun
+MAX_CHAT_HISTORY = 200
+MAX_DISPLAYED_MESSAGES = 50
+
+# Files whose bytes are kept in memory across reruns (matches the default
+# number of files cleanup_old_files keeps on disk)
+MAX_CACHED_FILES = 50
+
+# Format of the session token kept in the URL (a uuid4 hex string)
+SESSION_TOKEN_RE = re.compile(r"[0-9a-f]{32}")
+
+
+def new_chat_history() -> deque:
+    """Create an empty, bounded chat history."""
+    return deque(maxlen=MAX_CHAT_HISTORY)
+
+
+def get_session_key() -> str:
+    """
+    Get the key under which this session's thread is persisted.
+
+    Uses the signed-in user when Streamlit authentication is configured;
+    otherwise falls back to a random token kept in the URL, so a reload or app
+    restart resumes the same thread (anyone with the link can too). URL tokens
+    live under their own prefix and must be well-formed, so a link can't name
+    a signed-in user's key or a guessable one.
+    """
+    user = getattr(st, "user", None)
+    email = getattr(user, "email", None) if user is not None else None
+    if email:
+        return f"user:{email}"
+
+    token = st.query_params.get("session", "")
+    if not SESSION_TOKEN_RE.fullmatch(token):
+        token = uuid.uuid4().hex
+        st.query_params["session"] = token
+    return f"url:{token}"
+
 
 def initialize_session_state():
     """Initialize all session state variables."""
     if "messages" not in st.session_state:
-        st.session_state.messages = []
-    if "agent_manager" not in st.session_state:
-        st.session_state.agent_manager = None
-    if "agent_initialized" not in st.session_state:
-        st.session_state.agent_initialized = False
+        st.session_state.messages = new_chat_history()
+    if "session_key" not in st.session_state:
+        st.session_state.session_key = get_session_key()
     if "thread_id" not in st.session_state:
-        st.session_state.thread_id = None
+        st.session_state.thread_id = load_thread_id(st.session_state.session_key)
     if "pending_prompt" not in st.session_state:
         st.session_state.pending_prompt = None
 
 
+@st.cache_resource(show_spinner="Initializing Azure AI Agent...")
+def get_agent_manager() -> AzureAgentManager:
+    """
+    Create the Azure AI agent once per process and share it across sessions.
+
+    Raises:
+        RuntimeError: If the agent could not be initialized. Exceptions are not
+            cached, so the next rerun retries initialization.
+    """
+    agent_manager = create_agent_from_env()
+    if agent_manager is None:
+        raise RuntimeError("Failed to initialize agent. Please check your environment variables.")
+    return agent_manager
+
+
 def initialize_agent():
-    """Initialize the Azure AI agent if not already initialized."""
-    if not st.session_state.agent_initialized:
-        with st.spinner("Initializing Azure AI Agent..."):
-            try:
-                agent_manager = create_agent_from_env()
-                if agent_manager:
-                    st.session_state.agent_manager = agent_manager
-                    st.session_state.agent_initialized = True
-                    st.success("✅ Agent initialized successfully!")
-                    return True
-                else:
-                    st.error("❌ Failed to initialize agent. Please check your environment variables.")
-                    return False
-            except Exception as e:
-                st.error(f"❌ Error initializing agent: {str(e)}")
-                st.info("💡 Make sure you have:\n"
-                       "1. Set PROJECT_ENDPOINT and MODEL_DEPLOYMENT_NAME in your .env file\n"
-                       "2. Logged in to Azure CLI: `az login`\n"
-                       "3. Installed all requirements: `pip install -r requirements.txt`")
-                return False
-    return True
+    """Get the shared Azure AI agent, or None if it could not be initialized."""
+    try:
+        return get_agent_manager()
+    except Exception as e:
+        st.error(f"❌ Error initializing agent: {str(e)}")
+        st.info("💡 Make sure you have:\n"
+               "1. Set PROJECT_ENDPOINT and MODEL_DEPLOYMENT_NAME in your .env file\n"
+               "2. Logged in to Azure CLI: `az login`\n"
+               "3. Installed all requirements: `pip install -r requirements.txt`")
+        return None
+
+
+@st.cache_data(show_spinner=False, max_entries=MAX_CACHED_FILES)
+def _cached_file_bytes(path: str, mtime: float) -> Optional[bytes]:
+    """
+    Read a downloaded file once and reuse the bytes across reruns.
+
+    Args:
+        path: Path to the file
+        mtime: Modification time of the file, so edits invalidate the cache
+
+    Returns:
+        bytes: File contents or None if error
+    """
+    return read_file_bytes(path)
+
+
+def _render_files(files: list):
+    """
+    Render downloaded files: images inline, plus a download button for each.
+
+    Args:
+        files: List of file information dictionaries returned by download_files
+    """
+    for file_info in files:
+        if not file_info.get('success', False):
+            continue
+
+        local_path = file_info.get('local_path')
+        if not local_path:
+            continue
+
+        # A single stat both checks existence and provides the cache key
+        try:
+            mtime = os.stat(local_path).st_mtime
+        except FileNotFoundError:
+            continue
+
+        # Read once and share the bytes between the image and the download button
+        file_bytes = _cached_file_bytes(local_path, mtime)
+        if not file_bytes:
+            continue
+
+        file_type = file_info.get('type', 'file')
+        display_name = get_file_display_name(file_info)
+
+        # Display images inline
+        if file_type == 'image':
+            st.image(file_bytes, caption=display_name, use_container_width=True)
+
+        # Provide download button for all files
+        mime_type = get_mime_type(file_info)
+        file_name = file_info.get('file_name') or Path(local_path).name
+
+        st.download_button(
+            label=f"📥 Download {display_name}",
+            data=file_bytes,
+            file_name=file_name,
+            mime=mime_type,
+            key=f"download_{file_info['file_id']}"
+        )
 
 
 def display_message_with_files(role: str, content: str, files: list = None):
@@ -93,44 +208,18 @@ def display_message_with_files(role: str, content: str, files: list = None):
         st.write(content)
 
         if files:
-            for file_info in files:
-                if not file_info.get('success', False):
-                    continue
-
-                local_path = file_info.get('local_path')
-                if not local_path or not Path(local_path).exists():
-                    continue
-
-                file_type = file_info.get('type', 'file')
-                display_name = get_file_display_name(file_info)
-
-                # Display images inline
-                if file_type == 'image':
-                    st.image(local_path, caption=display_name, use_container_width=True)
-
-                # Provide download button for all files
-                file_bytes = read_file_bytes(local_path)
-                if file_bytes:
-                    mime_type = get_mime_type(file_info)
-                    file_name = Path(local_path).name
-
-                    st.download_button(
-                        label=f"📥 Download {display_name}",
-                        data=file_bytes,
-                        file_name=file_name,
-                        mime=mime_type,
-                        key=f"download_{file_info['file_id']}"
-                    )
+            _render_files(files)
 
 
-def process_user_message(user_message: str):
+def process_user_message(agent_manager: AzureAgentManager, user_message: str):
     """
     Process a user message and get agent response.
 
     Args:
+        agent_manager: Shared AzureAgentManager instance
         user_message: The message from the user
     """
-    if not st.session_state.agent_manager:
+    if not agent_manager:
         st.error("Agent not initialized!")
         return
 
@@ -145,96 +234,80 @@ def process_user_message(user_message: str):
     with st.chat_message("user"):
         st.write(user_message)
 
-    # Show assistant "thinking"
+    # The agent manager is shared across sessions, so each session owns its thread
+    if st.session_state.thread_id is None:
+        st.session_state.thread_id = agent_manager.create_thread()
+        if st.session_state.thread_id is None:
+            st.error("Error: Could not create a conversation thread")
+            return
+        save_thread_id(st.session_state.session_key, st.session_state.thread_id)
+
+    # Stream the assistant response as it is generated
     with st.chat_message("assistant"):
-        with st.spinner("Thinking..."):
-            # Send message to agent
-            response = st.session_state.agent_manager.send_message(
-                user_message=user_message,
-                thread_id=st.session_state.thread_id
-            )
-
-            # Update thread_id if this was the first message
-            if st.session_state.thread_id is None and st.session_state.agent_manager.thread_id:
-                st.session_state.thread_id = st.session_state.agent_manager.thread_id
-
-            # Handle response
-            if response['status'] in ['success', 'completed']:
-                assistant_text = response.get('text', 'No response')
-
-                # Download any generated files
-                files_info = response.get('files', [])
-                downloaded_files = []
-
-                if files_info:
-                    with st.spinner("Downloading generated files..."):
-                        downloaded_files = download_files(
-                            st.session_state.agent_manager,
-                            files_info
-                        )
-
-                # Display the response
-                st.write(assistant_text)
-
-                # Display files
-                for file_info in downloaded_files:
-                    if not file_info.get('success', False):
-                        continue
-
-                    local_path = file_info.get('local_path')
-                    if not local_path or not Path(local_path).exists():
-                        continue
-
-                    file_type = file_info.get('type', 'file')
-                    display_name = get_file_display_name(file_info)
-
-                    # Display images inline
-                    if file_type == 'image':
-                        st.image(local_path, caption=display_name, use_container_width=True)
-
-                    # Provide download button for all files
-                    file_bytes = read_file_bytes(local_path)
-                    if file_bytes:
-                        mime_type = get_mime_type(file_info)
-                        file_name = Path(local_path).name
-
-                        st.download_button(
-                            label=f"📥 Download {display_name}",
-                            data=file_bytes,
-                            file_name=file_name,
-                            mime=mime_type,
-                            key=f"download_{file_info['file_id']}"
-                        )
-
-                # Add to chat history
-                st.session_state.messages.append({
-                    "role": "assistant",
-                    "content": assistant_text,
-                    "files": downloaded_files
-                })
-
-            else:
-                # Error occurred
-                error_msg = response.get('error', 'Unknown error occurred')
-                st.error(f"Error: {error_msg}")
-
-                st.session_state.messages.append({
-                    "role": "assistant",
-                    "content": f"Error: {error_msg}",
-                    "files": []
-                })
-
-
-def render_sidebar():
+        response = {}
+        stream = agent_manager.send_message_stream(
+            user_message=user_message,
+            thread_id=st.session_state.thread_id,
+            response=response
+        )
+        try:
+            st.write_stream(stream)
+        finally:
+            # If Streamlit interrupts the script mid-answer, close the generator
+            # now so the unfinished run is cancelled right away
+            stream.close()
+
+        # Handle response
+        if response.get('status') in ['success', 'completed']:
+            assistant_text = response.get('text', 'No response')
+
+            # Download any generated files
+            files_info = response.get('files', [])
+            downloaded_files = []
+
+            if files_info:
+                with st.spinner("Downloading generated files..."):
+                    downloaded_files = download_files(
+                        agent_manager,
+                        files_info
+                    )
+
+            # Display files
+            _render_files(downloaded_files)
+
+            # Add to chat history
+            st.session_state.messages.append({
+                "role": "assistant",
+                "content": assistant_text,
+                "files": downloaded_files
+            })
+
+        else:
+            # Error occurred
+            error_msg = response.get('error', 'Unknown error occurred')
+            if response.get('thread_not_found'):
+                # The stored thread is gone; forget it so the next message starts a new one
+                clear_thread_id(st.session_state.session_key)
+                st.session_state.thread_id = None
+                error_msg = "The previous conversation is no longer available. Send your message again to start a new one."
+            st.error(f"Error: {error_msg}")
+
+            st.session_state.messages.append({
+                "role": "assistant",
+                "content": f"Error: {error_msg}",
+                "files": []
+            })
+
+
+def render_sidebar(manager: AzureAgentManager = None):
     """Render the sidebar with agent info and sample prompts."""
     with st.sidebar:
         st.title("🤖 Azure AI Agent")
 
         # Connection status
-        if st.session_state.agent_initialized:
+        if manager:
             st.success("✅ Connected")
-            manager = st.session_state.agent_manager
-            if manager and getattr(manager, "assistant", None):
+            if getattr(manager, "assistant", None):
                 assistant_name = getattr(manager.assistant, "name", None) or "code-demo"
                 st.info(f"**Assistant:** {assistant_name}")
                 st.info(f"**Model (deployment):** {manager.model_name}")
@@ -246,10 +319,7 @@ def render_sidebar():
         # Sample prompts section
         st.subheader("💡 Try these prompts:")
 
-        for i, prompt in enumerate(SAMPLE_PROMPTS):
-            # Create a shorter label for the button
-            label = prompt[:50] + "..." if len(prompt) > 50 else prompt
-
+        for i, (prompt, label) in enumerate(SAMPLE_PROMPT_LABELS):
             if st.button(label, key=f"sample_{i}", use_container_width=True):
                 st.session_state.pending_prompt = prompt
 
@@ -257,9 +327,11 @@ def render_sidebar():
 
         # Clear chat button
         if st.button("🗑️ Clear Chat", use_container_width=True):
-            st.session_state.messages = []
+            st.session_state.messages = new_chat_history()
             st.session_state.thread_id = None
-            cleanup_old_files(max_files=20)
+            clear_thread_id(st.session_state.session_key)
+            # Cleanup results aren't needed for the next render, so don't block on it
+            threading.Thread(target=cleanup_old_files, kwargs={"max_files": 20}, daemon=True).start()
             st.rerun()
 
         st.divider()
@@ -281,40 +353,46 @@ def render_sidebar():
 
 def main():
     """Main application function."""
+    # Route log records from utils/ (once per process; reruns are no-ops)
+    configure_logging()
+
     # Initialize session state
     initialize_session_state()
 
-    # Render sidebar
-    render_sidebar()
-
     # Main content area
     st.title("🤖 Azure AI Code Interpreter Demo")
     st.markdown("Ask the agent to create charts, analyze data, or generate files!")
 
-    # Initialize agent if needed
-    if not st.session_state.agent_initialized:
-        if not initialize_agent():
-            st.stop()
+    # Get the shared agent (created once per process)
+    agent_manager = initialize_agent()
+
+    # Render sidebar
+    render_sidebar(agent_manager)
 
-    # Display chat history
-    for message in st.session_state.messages:
+    if agent_manager is None:
+        st.stop()
+
+    # Display the most recent part of the chat history
+    messages = st.session_state.messages
+    for message in islice(messages, max(len(messages) - MAX_DISPLAYED_MESSAGES, 0), None):
         display_message_with_files(
             role=message["role"],
             content=message["content"],
             files=message.get("files", [])
         )
 
+    # New turns are streamed inline and replayed from history on later reruns,
+    # so neither path below needs an explicit st.rerun()
+
     # Handle pending prompt from sample buttons
     if st.session_state.pending_prompt:
         prompt = st.session_state.pending_prompt
         st.session_state.pending_prompt = None
-        process_user_message(prompt)
-        st.rerun()
+        process_user_message(agent_manager, prompt)
 
     # Chat input
     if prompt := st.chat_input("Ask the agent to generate charts or analyze data..."):
-        process_user_message(prompt)
-        st.rerun()
+        process_user_message(agent_manager, prompt)
 
 
 if __name__ == "__main__":
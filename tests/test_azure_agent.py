@@ -0,0 +1,236 @@
+"""Tests for utils.azure_agent, using a fake client in place of Azure OpenAI."""
+
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from openai import NotFoundError
+
+from utils import azure_agent
+from utils.azure_agent import AzureAgentManager
+
+
+def run_created(run_id):
+    return SimpleNamespace(event="thread.run.created", data=SimpleNamespace(id=run_id))
+
+
+def message_created():
+    return SimpleNamespace(event="thread.message.created", data=SimpleNamespace())
+
+
+def text_delta(value):
+    part = SimpleNamespace(type="text", text=SimpleNamespace(value=value))
+    return SimpleNamespace(
+        event="thread.message.delta",
+        data=SimpleNamespace(delta=SimpleNamespace(content=[part]))
+    )
+
+
+def text_content(value, annotations=()):
+    return SimpleNamespace(
+        type="text",
+        text=SimpleNamespace(value=value, annotations=list(annotations))
+    )
+
+
+def image_content(file_id):
+    return SimpleNamespace(type="image_file", image_file=SimpleNamespace(file_id=file_id))
+
+
+def file_annotation(ann_type, file_id, text):
+    return SimpleNamespace(type=ann_type, text=text, **{ann_type: SimpleNamespace(file_id=file_id)})
+
+
+def message(role, *content):
+    return SimpleNamespace(role=role, content=list(content))
+
+
+class FakeRunStream:
+    """Stands in for the runs.stream() context manager."""
+
+    def __init__(self, events, final_status, messages):
+        self.events = events
+        self.final_status = final_status
+        self.messages = messages
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def __iter__(self):
+        return iter(self.events)
+
+    def get_final_run(self):
+        return SimpleNamespace(status=self.final_status)
+
+    def get_final_messages(self):
+        return self.messages
+
+
+class FakeRuns:
+    def __init__(self, stream, statuses_after_cancel=("cancelled",)):
+        self._stream = stream
+        self.statuses_after_cancel = list(statuses_after_cancel)
+        self.calls = []
+
+    def stream(self, thread_id, assistant_id):
+        self.calls.append(("stream", thread_id))
+        return self._stream
+
+    def cancel(self, thread_id, run_id):
+        self.calls.append(("cancel", thread_id, run_id))
+        return SimpleNamespace(status="cancelling")
+
+    def retrieve(self, thread_id, run_id):
+        self.calls.append(("retrieve", thread_id, run_id))
+        return SimpleNamespace(status=self.statuses_after_cancel.pop(0))
+
+
+class FakeMessages:
+    def __init__(self, error=None):
+        self.error = error
+        self.created = []
+
+    def create(self, thread_id, role, content):
+        if self.error:
+            raise self.error
+        self.created.append((thread_id, role, content))
+
+
+def make_manager(stream=None, messages_error=None, statuses_after_cancel=("cancelled",)):
+    """Build a manager whose client is a fake with the given run stream."""
+    runs = FakeRuns(stream, statuses_after_cancel)
+    threads = SimpleNamespace(
+        create=lambda: SimpleNamespace(id="thread-new"),
+        messages=FakeMessages(messages_error),
+        runs=runs,
+    )
+    client = SimpleNamespace(beta=SimpleNamespace(threads=threads))
+    manager = AzureAgentManager("https://example.invalid", "model", client=client)
+    manager.assistant = SimpleNamespace(id="asst-1")
+    return manager, runs
+
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    """Don't wait between polls of a cancelled run."""
+    monkeypatch.setattr(azure_agent.time, "sleep", lambda seconds: None)
+
+
+def test_stream_yields_text_deltas_with_newline_between_messages():
+    stream = FakeRunStream(
+        [
+            run_created("run-1"),
+            message_created(),
+            text_delta("Hello"),
+            text_delta(" there"),
+            message_created(),
+            text_delta("Second"),
+        ],
+        "completed",
+        [],
+    )
+    manager, _ = make_manager(stream)
+
+    chunks = list(manager.send_message_stream("hi", thread_id="thread-1"))
+
+    assert chunks == ["Hello", " there", "\n", "Second"]
+
+
+def test_send_message_parses_text_and_files_from_final_messages():
+    messages = [
+        message("user", text_content("make a chart")),
+        message(
+            "assistant",
+            text_content(
+                "Here is your data",
+                [
+                    file_annotation("file_path", "file-csv", "sandbox:/mnt/data/data.csv"),
+                    file_annotation("file_citation", "file-cited", "source.txt"),
+                    SimpleNamespace(type="url_citation", text="ignored"),
+                ],
+            ),
+            image_content("file-img"),
+        ),
+        message("assistant", text_content("Done")),
+    ]
+    manager, runs = make_manager(FakeRunStream([run_created("run-1")], "completed", messages))
+
+    response = manager.send_message("make a chart", thread_id="thread-1")
+
+    assert response == {
+        "status": "success",
+        "text": "Here is your data\nDone",
+        "files": [
+            {"type": "file", "file_id": "file-csv", "text": "sandbox:/mnt/data/data.csv"},
+            {"type": "file", "file_id": "file-cited", "text": "source.txt"},
+            {"type": "image", "file_id": "file-img", "extension": ".png"},
+        ],
+    }
+    assert manager.client.beta.threads.messages.created == [("thread-1", "user", "make a chart")]
+    assert runs.calls == [("stream", "thread-1")]
+
+
+def test_send_message_reports_unsuccessful_run():
+    manager, _ = make_manager(FakeRunStream([run_created("run-1")], "failed", []))
+
+    response = manager.send_message("hi", thread_id="thread-1")
+
+    assert response == {"status": "failed", "error": "Run status: failed"}
+
+
+def test_closing_stream_early_cancels_run_and_waits_for_final_status():
+    stream = FakeRunStream(
+        [run_created("run-1"), message_created(), text_delta("Hel"), text_delta("lo")],
+        "completed",
+        [],
+    )
+    manager, runs = make_manager(stream, statuses_after_cancel=("cancelling", "cancelled"))
+
+    chunks = manager.send_message_stream("hi", thread_id="thread-1")
+    assert next(chunks) == "Hel"
+    chunks.close()
+
+    assert runs.calls == [
+        ("stream", "thread-1"),
+        ("cancel", "thread-1", "run-1"),
+        ("retrieve", "thread-1", "run-1"),
+        ("retrieve", "thread-1", "run-1"),
+    ]
+
+
+def test_finished_run_is_not_cancelled():
+    stream = FakeRunStream([run_created("run-1"), text_delta("Hi")], "completed", [])
+    manager, runs = make_manager(stream)
+
+    response = {}
+    list(manager.send_message_stream("hi", thread_id="thread-1", response=response))
+
+    assert response["status"] == "success"
+    assert runs.calls == [("stream", "thread-1")]
+
+
+def test_missing_thread_sets_thread_not_found():
+    error = NotFoundError(
+        "Thread not found",
+        response=httpx.Response(404, request=httpx.Request("POST", "https://example.invalid")),
+        body=None,
+    )
+    manager, runs = make_manager(messages_error=error)
+
+    response = manager.send_message("hi", thread_id="thread-gone")
+
+    assert response["status"] == "error"
+    assert response["thread_not_found"] is True
+    assert runs.calls == []
+
+
+def test_send_message_without_thread_creates_one():
+    manager, runs = make_manager(FakeRunStream([], "completed", []))
+
+    response = manager.send_message("hi")
+
+    assert response["status"] == "success"
+    assert runs.calls == [("stream", "thread-new")]
@@ -0,0 +1,269 @@
+"""Tests for utils.file_handler."""
+
+import os
+from collections import OrderedDict
+
+import pytest
+
+from utils import file_handler
+
+
+class FakeAgentManager:
+    """Stands in for AzureAgentManager, writing canned bytes per file ID."""
+
+    def __init__(self, contents=None, failures=()):
+        self.contents = contents or {}
+        self.failures = set(failures)
+
+    def download_file(self, file_id, file_path):
+        if file_id in self.failures:
+            return False
+        with open(file_path, 'wb') as f:
+            f.write(self.contents.get(file_id, b'a,b\n1,2\n'))
+        return True
+
+
+def reset_index_state(monkeypatch):
+    """Forget the in-memory index, as if the process had restarted."""
+    monkeypatch.setattr(file_handler, "_lru_index", OrderedDict())
+    monkeypatch.setattr(file_handler, "_lru_index_lines", 0)
+    monkeypatch.setattr(file_handler, "_lru_index_loaded", False)
+
+
+@pytest.fixture(autouse=True)
+def downloads_dir(tmp_path, monkeypatch):
+    """Run each test in an empty working directory with fresh module state."""
+    monkeypatch.chdir(tmp_path)
+    reset_index_state(monkeypatch)
+    file_handler.ensure_downloads_directory.cache_clear()
+    yield tmp_path / file_handler.DOWNLOADS_DIR
+    file_handler.ensure_downloads_directory.cache_clear()
+
+
+def make_file(directory, name, mtime):
+    """Create an empty file with a given modification time."""
+    directory.mkdir(exist_ok=True)
+    path = directory / name
+    path.write_bytes(b'')
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def index_lines():
+    with open(file_handler._LRU_INDEX_FILE, encoding='utf-8') as f:
+        return [line.split('\t')[0] for line in f]
+
+
+def remaining_files(directory):
+    return sorted(p.name for p in directory.iterdir() if not p.name.startswith('.'))
+
+
+def test_download_files_keeps_order_and_reports_failures():
+    files = [
+        {'file_id': 'chart', 'type': 'image', 'extension': '.png'},
+        {'file_id': 'broken', 'text': 'data.csv'},
+        {'text': 'no id'},
+        {'file_id': 'table', 'text': 'sandbox:/mnt/data/table.csv'},
+    ]
+
+    results = file_handler.download_files(FakeAgentManager(failures={'broken'}), files)
+
+    assert [r['file_id'] for r in results] == ['chart', 'broken', 'table']
+    assert [r['success'] for r in results] == [True, False, True]
+    assert results[2]['file_name'] == 'table.csv'
+    assert os.path.exists(results[2]['local_path'])
+
+
+def test_download_files_downloads_duplicate_ids_once(downloads_dir):
+    png = b'\x89PNG\r\n\x1a\n' + b'\x00' * 16
+    files = [
+        {'file_id': 'dup', 'text': 'first link'},
+        {'file_id': 'other', 'text': 'x.csv'},
+        {'file_id': 'dup', 'text': 'second link'},
+    ]
+
+    results = file_handler.download_files(FakeAgentManager(contents={'dup': png}), files)
+
+    assert [(r['file_id'], r['text']) for r in results] == [('dup', 'first link'), ('other', 'x.csv')]
+    assert all(r['success'] for r in results)
+    assert all(os.path.exists(r['local_path']) for r in results)
+    assert remaining_files(downloads_dir) == ['dup.png', 'other.csv']
+    assert sorted(index_lines()) == [
+        os.path.join('downloads', 'dup.png'),
+        os.path.join('downloads', 'other.csv'),
+    ]
+
+def test_first_download_seeds_index_from_existing_files(downloads_dir):
+    make_file(downloads_dir, 'old-b.csv', 200)
+    make_file(downloads_dir, 'old-a.csv', 100)
+
+    file_handler.download_files(FakeAgentManager(), [{'file_id': 'new', 'text': 'x.csv'}])
+
+    # Existing files come first by age, and the new file is recorded exactly once
+    assert index_lines() == [
+        os.path.join('downloads', 'old-a.csv'),
+        os.path.join('downloads', 'old-b.csv'),
+        os.path.join('downloads', 'new.csv'),
+    ]
+
+
+def test_cleanup_evicts_oldest_files_first(downloads_dir):
+    for i in range(5):
+        make_file(downloads_dir, f'f{i}.csv', 100 + i)
+
+    file_handler.cleanup_old_files(max_files=2)
+
+    assert remaining_files(downloads_dir) == ['f3.csv', 'f4.csv']
+    assert index_lines() == [
+        os.path.join('downloads', 'f3.csv'),
+        os.path.join('downloads', 'f4.csv'),
+    ]
+
+
+def test_cleanup_treats_redownloaded_file_as_newest(downloads_dir):
+    manager = FakeAgentManager()
+    for file_id in ('a', 'b', 'c'):
+        file_handler.download_files(manager, [{'file_id': file_id, 'text': 'x.csv'}])
+    file_handler.download_files(manager, [{'file_id': 'a', 'text': 'x.csv'}])
+
+    file_handler.cleanup_old_files(max_files=2)
+
+    assert remaining_files(downloads_dir) == ['a.csv', 'c.csv']
+
+
+def test_index_is_compacted_when_log_grows(downloads_dir):
+    manager = FakeAgentManager()
+    file_handler.download_files(manager, [{'file_id': 'a', 'text': 'x.csv'}])
+    for _ in range(10):
+        file_handler.download_files(manager, [{'file_id': 'b', 'text': 'x.csv'}])
+
+    lines = index_lines()
+    assert len(lines) <= 2 * len(set(lines))
+    assert set(lines) == {os.path.join('downloads', 'a.csv'), os.path.join('downloads', 'b.csv')}
+
+
+def test_corrupted_index_line_is_skipped(downloads_dir):
+    old = make_file(downloads_dir, 'old.csv', 100)
+    new = make_file(downloads_dir, 'new.csv', 200)
+    with open(file_handler._LRU_INDEX_FILE, 'w', encoding='utf-8') as f:
+        f.write(f"{os.path.join('downloads', 'old.csv')}\t100.0\n")
+        f.write("garbage without a timestamp\n")
+        f.write(os.path.join('downloads', 'ne'))  # torn final line
+
+    file_handler.cleanup_old_files(max_files=1)
+
+    assert not old.exists()
+    assert new.exists()
+    assert 'garbage without a timestamp' not in index_lines()
+
+
+def test_files_missing_from_index_are_still_evicted(downloads_dir):
+    make_file(downloads_dir, 'tracked.csv', 300)
+    make_file(downloads_dir, 'untracked.csv', 100)
+    with open(file_handler._LRU_INDEX_FILE, 'w', encoding='utf-8') as f:
+        f.write(f"{os.path.join('downloads', 'tracked.csv')}\t300.0\n")
+
+    file_handler.cleanup_old_files(max_files=1)
+
+    assert remaining_files(downloads_dir) == ['tracked.csv']
+
+
+def test_unreadable_index_falls_back_to_directory_scan(downloads_dir):
+    for i in range(3):
+        make_file(downloads_dir, f'f{i}.csv', 100 + i)
+    # A directory where the index file should be makes open() raise OSError
+    os.mkdir(file_handler._LRU_INDEX_FILE)
+
+    file_handler.cleanup_old_files(max_files=1)
+
+    assert remaining_files(downloads_dir) == ['f2.csv']
+
+
+def test_index_survives_restart(downloads_dir, monkeypatch):
+    manager = FakeAgentManager()
+    for file_id in ('a', 'b', 'c'):
+        file_handler.download_files(manager, [{'file_id': file_id, 'text': 'x.csv'}])
+    # Make on-disk mtimes disagree with download order to prove the index is used
+    os.utime(downloads_dir / 'a.csv', (999, 999))
+
+    reset_index_state(monkeypatch)
+    file_handler.cleanup_old_files(max_files=1)
+
+    assert remaining_files(downloads_dir) == ['c.csv']
+
+
+@pytest.mark.parametrize('content, expected', [
+    (b'\x89PNG\r\n\x1a\n' + b'\x00' * 16, 'image/png'),
+    (b'\xff\xd8\xff\xe0' + b'\x00' * 16, 'image/jpeg'),
+    (b'GIF89a' + b'\x00' * 16, 'image/gif'),
+    (b'%PDF-1.7\n', 'application/pdf'),
+    (b'PK\x03\x04' + b'\x00' * 16, 'application/zip'),
+    (b'\xef\xbb\xbf  {"a": [1, 2]}\n', 'application/json'),
+    (b'[1, 2, 3]', 'application/json'),
+    (b'[section]\nkey = value\n', None),
+    (b'{not json at all', None),
+    (b'a,b\n1,2\n', None),
+])
+def test_sniff_mime_type(tmp_path, content, expected):
+    path = tmp_path / 'file'
+    path.write_bytes(content)
+
+    assert file_handler._sniff_mime_type(str(path)) == expected
+
+
+def test_sniff_mime_type_skips_oversized_json(tmp_path, monkeypatch):
+    monkeypatch.setattr(file_handler, '_JSON_SNIFF_MAX_BYTES', 8)
+    path = tmp_path / 'big.json'
+    path.write_bytes(b'[1, 2, 3, 4, 5]')
+
+    assert file_handler._sniff_mime_type(str(path)) is None
+
+
+def test_sniff_mime_type_missing_file(tmp_path):
+    assert file_handler._sniff_mime_type(str(tmp_path / 'missing')) is None
+
+
+@pytest.mark.parametrize('file_info, expected', [
+    ({'mime_type': 'application/pdf', 'type': 'image', 'extension': '.csv'}, 'application/pdf'),
+    ({'type': 'image', 'extension': '.csv'}, 'image/png'),
+    ({'extension': '.csv'}, 'text/csv'),
+    ({'text': 'results.json'}, 'application/json'),
+    ({'extension': '.unknown'}, 'application/octet-stream'),
+])
+def test_get_mime_type_precedence(file_info, expected):
+    assert file_handler.get_mime_type(file_info) == expected
+
+
+def test_download_renames_file_to_sniffed_type(downloads_dir):
+    manager = FakeAgentManager(contents={'chart': b'\x89PNG\r\n\x1a\n' + b'\x00' * 16})
+
+    [result] = file_handler.download_files(manager, [{'file_id': 'chart', 'text': 'here you go'}])
+
+    assert result['mime_type'] == 'image/png'
+    assert result['file_name'] == 'chart.png'
+    assert result['extension'] == '.png'
+    assert result['local_path'] == os.path.join('downloads', 'chart.png')
+    assert remaining_files(downloads_dir) == ['chart.png']
+    assert index_lines() == [os.path.join('downloads', 'chart.png')]
+
+
+def test_download_keeps_name_matching_sniffed_type(downloads_dir):
+    manager = FakeAgentManager(contents={'photo': b'\xff\xd8\xff\xe0' + b'\x00' * 16})
+
+    [result] = file_handler.download_files(manager, [{'file_id': 'photo', 'extension': '.jpeg'}])
+
+    assert result['mime_type'] == 'image/jpeg'
+    assert result['file_name'] == 'photo.jpeg'
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('sandbox:/mnt/data/report.csv', 'report.csv'),
+    ('C:\\data\\report.csv', 'report.csv'),
+    ('sandbox:/mnt/data/', 'data'),
+    ('results/', 'results'),
+    ('/', 'Generated File'),
+    ('summary', 'Data File (summary)'),
+    ('', 'Generated File'),
+])
+def test_get_file_display_name(text, expected):
+    assert file_handler.get_file_display_name({'type': 'file', 'text': text}) == expected
@@ -0,0 +1,56 @@
+"""Tests for utils.log_config."""
+
+import logging
+import logging.handlers
+
+import pytest
+
+from utils import file_handler, log_config
+
+
+@pytest.fixture(autouse=True)
+def fresh_configure_logging(monkeypatch):
+    """Reset configure_logging and the utils logger level around each test."""
+    utils_logger = logging.getLogger("utils")
+    monkeypatch.setattr(utils_logger, "level", logging.NOTSET)
+    log_config.configure_logging.cache_clear()
+    yield
+    log_config.configure_logging.cache_clear()
+
+
+def empty_root_handlers(monkeypatch):
+    """
+    Detach all root handlers for the rest of the test.
+
+    Called from the test body because pytest attaches its capture handlers
+    to the root logger after fixtures have run.
+    """
+    root = logging.getLogger()
+    monkeypatch.setattr(root, "handlers", [])
+    return root
+
+
+def test_importing_file_handler_leaves_logging_alone():
+    assert file_handler.logger.handlers == []
+    assert file_handler.logger.propagate is True
+
+
+def test_configure_logging_installs_one_queue_handler(monkeypatch):
+    root = empty_root_handlers(monkeypatch)
+
+    log_config.configure_logging()
+    log_config.configure_logging()
+
+    assert [type(h) for h in root.handlers] == [logging.handlers.QueueHandler]
+    assert file_handler.logger.isEnabledFor(logging.INFO)
+
+
+def test_configure_logging_keeps_existing_root_handlers(monkeypatch):
+    root = empty_root_handlers(monkeypatch)
+    existing = logging.NullHandler()
+    root.addHandler(existing)
+
+    log_config.configure_logging()
+
+    assert root.handlers == [existing]
+    assert file_handler.logger.isEnabledFor(logging.INFO)
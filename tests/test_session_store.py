@@ -0,0 +1,104 @@
+"""Tests for utils.session_store."""
+
+import sqlite3
+import time
+
+import pytest
+
+from utils import session_store
+
+
+@pytest.fixture(autouse=True)
+def session_db(tmp_path, monkeypatch):
+    """Point the session store at a fresh database for each test."""
+    db_path = tmp_path / "sessions.db"
+    monkeypatch.setenv("SESSION_DB_PATH", str(db_path))
+    return db_path
+
+
+def test_load_thread_id_returns_none_for_unknown_session():
+    assert session_store.load_thread_id("unknown") is None
+
+
+def test_save_and_load_thread_id_round_trip():
+    session_store.save_thread_id("session-a", "thread-1")
+
+    assert session_store.load_thread_id("session-a") == "thread-1"
+
+
+def test_save_thread_id_replaces_existing_thread():
+    session_store.save_thread_id("session-a", "thread-1")
+    session_store.save_thread_id("session-a", "thread-2")
+
+    assert session_store.load_thread_id("session-a") == "thread-2"
+
+
+def test_sessions_are_isolated():
+    session_store.save_thread_id("session-a", "thread-1")
+    session_store.save_thread_id("session-b", "thread-2")
+
+    assert session_store.load_thread_id("session-a") == "thread-1"
+    assert session_store.load_thread_id("session-b") == "thread-2"
+
+
+def test_clear_thread_id_removes_only_that_session():
+    session_store.save_thread_id("session-a", "thread-1")
+    session_store.save_thread_id("session-b", "thread-2")
+
+    session_store.clear_thread_id("session-a")
+
+    assert session_store.load_thread_id("session-a") is None
+    assert session_store.load_thread_id("session-b") == "thread-2"
+
+
+def test_thread_id_persists_in_database_file(session_db):
+    session_store.save_thread_id("session-a", "thread-1")
+
+    with sqlite3.connect(str(session_db)) as conn:
+        rows = conn.execute("SELECT session_key, thread_id FROM threads").fetchall()
+    assert rows == [("session-a", "thread-1")]
+
+
+def test_load_thread_id_handles_database_errors(tmp_path, monkeypatch):
+    # A directory cannot be opened as a SQLite database
+    monkeypatch.setenv("SESSION_DB_PATH", str(tmp_path))
+
+    assert session_store.load_thread_id("session-a") is None
+
+
+def set_updated_at(session_db, session_key, updated_at):
+    with sqlite3.connect(str(session_db)) as conn:
+        conn.execute(
+            "UPDATE threads SET updated_at = ? WHERE session_key = ?",
+            (updated_at, session_key)
+        )
+
+
+def test_load_thread_id_ignores_expired_session(session_db):
+    session_store.save_thread_id("session-a", "thread-1")
+    set_updated_at(session_db, "session-a", time.time() - session_store.SESSION_TTL_SECONDS - 1)
+
+    assert session_store.load_thread_id("session-a") is None
+
+
+def test_load_thread_id_refreshes_session(session_db):
+    session_store.save_thread_id("session-a", "thread-1")
+    stale = time.time() - session_store.SESSION_TTL_SECONDS + 60
+    set_updated_at(session_db, "session-a", stale)
+
+    assert session_store.load_thread_id("session-a") == "thread-1"
+
+    with sqlite3.connect(str(session_db)) as conn:
+        [(updated_at,)] = conn.execute("SELECT updated_at FROM threads").fetchall()
+    assert updated_at > stale
+
+
+def test_save_thread_id_prunes_expired_sessions(session_db):
+    session_store.save_thread_id("old", "thread-1")
+    set_updated_at(session_db, "old", time.time() - session_store.SESSION_TTL_SECONDS - 1)
+
+    session_store.save_thread_id("new", "thread-2")
+
+    with sqlite3.connect(str(session_db)) as conn:
+        rows = conn.execute("SELECT session_key FROM threads").fetchall()
+    assert rows == [("new",)]
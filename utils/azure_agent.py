@@ -6,14 +6,18 @@ URL under it (for example, a model/deployment URL). The host portion will
 be used to construct the AzureOpenAI client endpoint.
 """
 
+import functools
 import os
-from typing import Dict, Optional, Any
+import time
+from typing import Dict, Iterator, Optional, Any
 from urllib.parse import urlparse
 
-from openai import AzureOpenAI
+import httpx
+from openai import AzureOpenAI, DefaultHttpxClient, NotFoundError
 from azure.identity import DefaultAzureCredential, get_bearer_token_provider
 
 
+@functools.lru_cache(maxsize=8)
 def _normalize_azure_endpoint(endpoint: str) -> str:
     """
     Normalize a PROJECT_ENDPOINT or model URI to the Azure OpenAI resource endpoint.
@@ -28,18 +32,65 @@ def _normalize_azure_endpoint(endpoint: str) -> str:
     return f"{parsed.scheme}://{parsed.netloc}"
 
 
+@functools.lru_cache(maxsize=1)
+def _get_token_provider():
+    """
+    Return a bearer token provider backed by a process-wide DefaultAzureCredential.
+
+    The credential is created on first use and reused afterwards, so its
+    credential probing and token cache are shared by every client.
+    """
+    return get_bearer_token_provider(
+        DefaultAzureCredential(),
+        "https://cognitiveservices.azure.com/.default"
+    )
+
+
 DEBUG_AGENT_LOGS = os.environ.get("DEBUG_AGENT_LOGS", "").lower() in ("1", "true", "yes", "on")
 
+# Run states after which a run no longer blocks new messages on its thread
+_FINAL_RUN_STATUSES = frozenset({"completed", "failed", "cancelled", "expired", "incomplete"})
+
+# How long to wait for a cancelled run to settle, and how often to check
+_CANCEL_TIMEOUT_SECONDS = 10.0
+_CANCEL_POLL_SECONDS = 0.5
+
+# Annotation types that reference a file; each stores it under an attribute of the same name
+_FILE_ANNOTATION_TYPES = frozenset({"file_path", "file_citation"})
+
+# Connection pool limits for the shared client; sized for concurrent file
+# downloads from several sessions at once
+HTTP_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=50)
+
+
+def create_openai_client(endpoint: str) -> AzureOpenAI:
+    """
+    Create an AzureOpenAI client authenticated with DefaultAzureCredential.
+
+    The client owns a pooled HTTP connection and is safe to share between
+    AzureAgentManager instances and threads.
+    """
+    token_provider = _get_token_provider()
+
+    # Normalize to Azure OpenAI resource endpoint (scheme + host)
+    azure_endpoint = _normalize_azure_endpoint(endpoint)
+
+    return AzureOpenAI(
+        azure_ad_token_provider=token_provider,
+        api_version="2024-05-01-preview",
+        azure_endpoint=azure_endpoint,
+        http_client=DefaultHttpxClient(limits=HTTP_LIMITS)
+    )
+
 
 class AzureAgentManager:
     """Simple agent manager using OpenAI SDK"""
 
-    def __init__(self, endpoint: str, model_name: str):
+    def __init__(self, endpoint: str, model_name: str, client: Optional[AzureOpenAI] = None):
         self.endpoint = endpoint
         self.model_name = model_name
-        self.client = None
+        self.client = client
         self.assistant = None
-        self.thread_id = None
 
     def initialize(self) -> bool:
         """Initialize OpenAI client and create assistant"""
@@ -47,20 +98,9 @@ class AzureAgentManager:
             if DEBUG_AGENT_LOGS:
                 print(f"[DEBUG] Initializing AzureAgentManager with endpoint={self.endpoint}, model={self.model_name}")
 
-            # Get token provider
-            token_provider = get_bearer_token_provider(
-                DefaultAzureCredential(),
-                "https://cognitiveservices.azure.com/.default"
-            )
-
-            # Normalize to Azure OpenAI resource endpoint (scheme + host)
-            azure_endpoint = _normalize_azure_endpoint(self.endpoint)
-
-            self.client = AzureOpenAI(
-                azure_ad_token_provider=token_provider,
-                api_version="2024-05-01-preview",
-                azure_endpoint=azure_endpoint
-            )
+            # Reuse an injected client; otherwise create one
+            if self.client is None:
+                self.client = create_openai_client(self.endpoint)
 
             # Create assistant
             self.assistant = self.client.beta.assistants.create(
@@ -80,109 +120,173 @@ class AzureAgentManager:
             return False
 
     def create_thread(self) -> Optional[str]:
-        """Create conversation thread"""
+        """
+        Create conversation thread and return its ID.
+
+        The manager is shared across sessions, so callers own the returned ID;
+        it is not stored on the manager.
+        """
         try:
             thread = self.client.beta.threads.create()
-            self.thread_id = thread.id
             if DEBUG_AGENT_LOGS:
-                print(f"[DEBUG] Created thread: {self.thread_id}")
-            return self.thread_id
+                print(f"[DEBUG] Created thread: {thread.id}")
+            return thread.id
         except Exception as e:
             print(f"Thread error: {e}")
             return None
 
     def send_message(self, user_message: str, thread_id: Optional[str] = None) -> Optional[Dict]:
         """Send message and get response"""
+        response: Dict[str, Any] = {}
+        for _ in self.send_message_stream(user_message, thread_id, response):
+            pass
+        return response
+
+    def send_message_stream(
+        self,
+        user_message: str,
+        thread_id: Optional[str] = None,
+        response: Optional[Dict[str, Any]] = None,
+    ) -> Iterator[str]:
+        """
+        Send message and yield assistant text deltas as they arrive.
+
+        Once the generator is exhausted, ``response`` is filled with the same
+        status/text/files payload that ``send_message`` returns. If the thread
+        no longer exists, the error payload also sets ``thread_not_found``.
+        """
+        if response is None:
+            response = {}
         try:
-            tid = thread_id or self.thread_id
+            # Without a thread ID, start a new thread rather than reusing shared state
+            tid = thread_id or self.create_thread()
             if not tid:
-                tid = self.create_thread()
+                response.update({'status': 'error', 'error': 'Could not create a conversation thread'})
+                return
 
             if DEBUG_AGENT_LOGS:
                 print(f"[DEBUG] Sending message to assistant {self.assistant.id} on thread {tid}: {user_message}")
 
-            # Create message
-            self.client.beta.threads.messages.create(
-                thread_id=tid,
-                role="user",
-                content=user_message
-            )
-
-            # Run and poll
-            run = self.client.beta.threads.runs.create_and_poll(
-                thread_id=tid,
-                assistant_id=self.assistant.id
-            )
+            # Create message; a 404 here means the thread no longer exists server-side
+            try:
+                self.client.beta.threads.messages.create(
+                    thread_id=tid,
+                    role="user",
+                    content=user_message
+                )
+            except NotFoundError as e:
+                response.update({'status': 'error', 'error': str(e), 'thread_not_found': True})
+                return
+
+            # Run and stream; if the consumer stops early (e.g. a Streamlit rerun
+            # closes this generator), cancel the run so the thread isn't left busy
+            run_id = None
+            run_finished = False
+            try:
+                with self.client.beta.threads.runs.stream(
+                    thread_id=tid,
+                    assistant_id=self.assistant.id
+                ) as stream:
+                    emitted_text = False
+                    for event in stream:
+                        if event.event == "thread.run.created":
+                            run_id = event.data.id
+                        elif event.event == "thread.message.created" and emitted_text:
+                            # Separate consecutive assistant messages within one run
+                            yield "\n"
+                        elif event.event == "thread.message.delta":
+                            for part in event.data.delta.content or []:
+                                if part.type == "text" and part.text and part.text.value:
+                                    emitted_text = True
+                                    yield part.text.value
+
+                    run = stream.get_final_run()
+                    messages = stream.get_final_messages()
+                    run_finished = True
+            finally:
+                if run_id and not run_finished:
+                    self._cancel_run(tid, run_id)
 
             if DEBUG_AGENT_LOGS:
                 print(f"[DEBUG] Run status: {run.status}")
 
             if run.status == 'completed':
-                messages = self.client.beta.threads.messages.list(thread_id=tid)
-
-                for msg in messages.data:
-                    if msg.role == "assistant":
-                        text = []
-                        files = []
-
-                        for content in msg.content:
-                            # Text content (and embedded annotations)
-                            if hasattr(content, "text") and content.text:
-                                text.append(content.text.value)
-
-                                # Look for file-related annotations (file_path, file_citation)
-                                annotations = getattr(content.text, "annotations", []) or []
-                                for ann in annotations:
-                                    ann_type = getattr(ann, "type", None)
-                                    if ann_type == "file_path":
-                                        file_obj = getattr(ann, "file_path", None)
-                                    elif ann_type == "file_citation":
-                                        file_obj = getattr(ann, "file_citation", None)
-                                    else:
-                                        file_obj = None
-
-                                    file_id = getattr(file_obj, "file_id", None) if file_obj else None
-                                    if file_id:
-                                        files.append({
-                                            "type": "file",
-                                            "file_id": file_id,
-                                            "text": getattr(ann, "text", "") or "",
-                                        })
-
-                            # Image output from code interpreter
-                            if hasattr(content, "image_file") and content.image_file:
-                                files.append({
-                                    "type": "image",
-                                    "file_id": content.image_file.file_id,
-                                    "extension": ".png",
-                                })
-                        if DEBUG_AGENT_LOGS:
-                            try:
-                                print("[DEBUG] Raw assistant message:")
-                                # Many OpenAI types support model_dump_json; fall back to repr
-                                print(msg.model_dump_json(indent=2))  # type: ignore[attr-defined]
-                            except Exception:
-                                print(msg)
-                            print(f"[DEBUG] Parsed text: {' '.join(text)}")
-                            print(f"[DEBUG] Parsed files: {files}")
-
-                        return {
-                            "status": "success",
-                            "text": "\n".join(text),
-                            "files": files,
-                        }
-
-            return {'status': 'failed', 'error': f'Run status: {run.status}'}
+                text = []
+                files = []
+
+                for msg in messages:
+                    if msg.role != "assistant":
+                        continue
+
+                    for content in msg.content:
+                        content_type = getattr(content, "type", None)
+
+                        # Text content (and embedded annotations)
+                        if content_type == "text" and content.text:
+                            text.append(content.text.value)
+
+                            # Look for file-related annotations (file_path, file_citation)
+                            annotations = content.text.annotations or ()
+                            for ann in annotations:
+                                ann_type = getattr(ann, "type", None)
+                                file_obj = getattr(ann, ann_type, None) if ann_type in _FILE_ANNOTATION_TYPES else None
+                                file_id = getattr(file_obj, "file_id", None) if file_obj else None
+                                if file_id:
+                                    files.append({
+                                        "type": "file",
+                                        "file_id": file_id,
+                                        "text": getattr(ann, "text", "") or "",
+                                    })
+
+                        # Image output from code interpreter
+                        elif content_type == "image_file" and content.image_file:
+                            files.append({
+                                "type": "image",
+                                "file_id": content.image_file.file_id,
+                                "extension": ".png",
+                            })
+                    if DEBUG_AGENT_LOGS:
+                        try:
+                            print("[DEBUG] Raw assistant message:")
+                            # Many OpenAI types support model_dump_json; fall back to repr
+                            print(msg.model_dump_json(indent=2))  # type: ignore[attr-defined]
+                        except Exception:
+                            print(msg)
+
+                if DEBUG_AGENT_LOGS:
+                    print(f"[DEBUG] Parsed text: {' '.join(text)}")
+                    print(f"[DEBUG] Parsed files: {files}")
+
+                response.update({
+                    "status": "success",
+                    "text": "\n".join(text),
+                    "files": files,
+                })
+                return
+
+            response.update({'status': 'failed', 'error': f'Run status: {run.status}'})
 
         except Exception as e:
-            return {'status': 'error', 'error': str(e)}
+            response.update({'status': 'error', 'error': str(e)})
+
+    def _cancel_run(self, thread_id: str, run_id: str):
+        """Cancel an unfinished run and wait briefly until it stops blocking the thread"""
+        try:
+            if DEBUG_AGENT_LOGS:
+                print(f"[DEBUG] Cancelling interrupted run {run_id} on thread {thread_id}")
+            run = self.client.beta.threads.runs.cancel(thread_id=thread_id, run_id=run_id)
+            deadline = time.monotonic() + _CANCEL_TIMEOUT_SECONDS
+            while run.status not in _FINAL_RUN_STATUSES and time.monotonic() < deadline:
+                time.sleep(_CANCEL_POLL_SECONDS)
+                run = self.client.beta.threads.runs.retrieve(thread_id=thread_id, run_id=run_id)
+        except Exception as e:
+            print(f"Cancel error: {e}")
 
     def download_file(self, file_id: str, file_path: str) -> bool:
-        """Download file"""
+        """Download file, streaming the body to disk in chunks"""
         try:
-            content = self.client.files.content(file_id)
-            with open(file_path, 'wb') as f:
-                f.write(content.read())
+            with self.client.files.with_streaming_response.content(file_id) as response:
+                response.stream_to_file(file_path)
             return True
         except Exception as e:
             print(f"Download error: {e}")
@@ -197,13 +301,13 @@ class AzureAgentManager:
             pass
 
 
-def create_agent_from_env() -> Optional[AzureAgentManager]:
-    """Create agent from environment variables"""
+def create_agent_from_env(client: Optional[AzureOpenAI] = None) -> Optional[AzureAgentManager]:
+    """Create agent from environment variables, optionally sharing an existing client"""
     endpoint = os.environ.get("PROJECT_ENDPOINT")
     model = os.environ.get("MODEL_DEPLOYMENT_NAME")
 
     if not endpoint or not model:
         return None
 
-    manager = AzureAgentManager(endpoint, model)
+    manager = AzureAgentManager(endpoint, model, client=client)
     return manager if manager.initialize() else None
@@ -3,19 +3,117 @@ File handling utilities for managing generated files from Azure AI agents.
 Handles file downloads, path management, and file type detection.
 """
 
+import functools
+import json
+import logging
 import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import List, Optional, TypedDict
 
 
+class FileInfo(TypedDict, total=False):
+    """
+    Metadata for a file produced by the assistant.
+
+    'file_id' and 'type' come from the parsed assistant message, 'text' or
+    'extension' hint at the file type, and download_files adds the remaining
+    keys describing the outcome (including 'mime_type' when the downloaded
+    content is recognized).
+    """
+    file_id: str
+    type: str
+    text: str
+    extension: str
+    local_path: str
+    file_name: str
+    success: bool
+    error: str
+    mime_type: str
+
+
+logger = logging.getLogger(__name__)
+
 # Directory where generated files will be stored
 DOWNLOADS_DIR = Path("downloads")
 
-
+# Maximum number of files downloaded concurrently
+MAX_DOWNLOAD_WORKERS = 8
+
+# Keywords in annotation text that hint at a file type, matched in a single pass
+_EXT_KEYWORD_RE = re.compile(r'csv|json|txt|text', re.IGNORECASE)
+
+# Keyword -> extension, in priority order when several keywords are present
+_EXT_BY_KEYWORD = (('csv', '.csv'), ('json', '.json'), ('txt', '.txt'), ('text', '.txt'))
+
+# Fixed extension per file type ('file' is resolved from its annotation text)
+_EXT_BY_TYPE = {'image': '.png'}
+
+# MIME type per file extension
+_MIME_TABLE = {
+    '.png': 'image/png',
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.csv': 'text/csv',
+    '.json': 'application/json',
+    '.txt': 'text/plain',
+    '.gif': 'image/gif',
+    '.pdf': 'application/pdf',
+    '.zip': 'application/zip',
+}
+
+# Extension to save a file under when its content is sniffed as a MIME type
+_EXT_BY_MIME = {
+    'image/png': '.png',
+    'image/jpeg': '.jpg',
+    'image/gif': '.gif',
+    'application/pdf': '.pdf',
+    'application/zip': '.zip',
+    'application/json': '.json',
+}
+
+# Leading bytes of binary formats the code interpreter commonly produces
+_MIME_SIGNATURES = (
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+    (b'%PDF-', 'application/pdf'),
+    (b'PK\x03\x04', 'application/zip'),
+)
+
+# Number of leading bytes read when sniffing a downloaded file
+_SNIFF_BYTES = 512
+
+# Largest file fully parsed to confirm it is JSON; bigger files aren't sniffed as JSON
+_JSON_SNIFF_MAX_BYTES = 1 << 20
+
+# On-disk LRU index of downloaded files: one "path<TAB>timestamp" line per download
+LRU_INDEX_PATH = DOWNLOADS_DIR / ".lru_index"
+
+# Plain string forms of the index paths, used directly with os-level calls
+_LRU_INDEX_FILE = os.fspath(LRU_INDEX_PATH)
+_LRU_INDEX_TMP_FILE = _LRU_INDEX_FILE + ".tmp"
+
+# In-memory view of the LRU index (path -> download time, oldest first), loaded lazily
+_lru_index: "OrderedDict[str, float]" = OrderedDict()
+_lru_index_lines = 0
+_lru_index_loaded = False
+_lru_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=None)
 def ensure_downloads_directory() -> Path:
     """
     Ensure the downloads directory exists.
 
+    The directory is created on the first successful call only; later calls
+    return the cached path without touching the filesystem.
+
     Returns:
         Path: Path to the downloads directory
     """
@@ -23,7 +121,25 @@ def ensure_downloads_directory() -> Path:
     return DOWNLOADS_DIR
 
 
-def get_file_extension(file_info: Dict[str, Any]) -> str:
+@functools.lru_cache(maxsize=256)
+def _extension_from_text(text: str) -> str:
+    """
+    Guess a data file extension from its annotation text.
+
+    Args:
+        text: Annotation text of the file
+
+    Returns:
+        str: File extension including the dot, defaulting to '.csv'
+    """
+    keywords = {match.lower() for match in _EXT_KEYWORD_RE.findall(text)}
+    for keyword, extension in _EXT_BY_KEYWORD:
+        if keyword in keywords:
+            return extension
+    return '.csv'  # Default to CSV for data files
+
+
+def get_file_extension(file_info: FileInfo) -> str:
     """
     Determine the file extension based on file information.
 
@@ -39,25 +155,14 @@ def get_file_extension(file_info: Dict[str, Any]) -> str:
 
     # Determine by file type
     file_type = file_info.get('type', 'file')
-    if file_type == 'image':
-        return '.png'
-    elif file_type == 'file':
-        # Could be CSV or other types
-        # Check if text field gives us a clue
-        text = file_info.get('text', '').lower()
-        if 'csv' in text:
-            return '.csv'
-        elif 'json' in text:
-            return '.json'
-        elif 'txt' in text or 'text' in text:
-            return '.txt'
-        else:
-            return '.csv'  # Default to CSV for data files
+    if file_type == 'file':
+        # Could be CSV or other types; check if text field gives us a clue
+        return _extension_from_text(file_info.get('text', ''))
 
-    return '.dat'  # Generic fallback
+    return _EXT_BY_TYPE.get(file_type, '.dat')  # Generic fallback
 
 
-def generate_file_path(file_id: str, file_info: Dict[str, Any]) -> Path:
+def generate_file_path(file_id: str, file_info: FileInfo) -> Path:
     """
     Generate a local file path for a downloaded file.
 
@@ -68,16 +173,213 @@ def generate_file_path(file_id: str, file_info: Dict[str, Any]) -> Path:
     Returns:
         Path: Full path where the file should be saved
     """
-    ensure_downloads_directory()
     extension = get_file_extension(file_info)
     file_name = f"{file_id}{extension}"
     return DOWNLOADS_DIR / file_name
 
 
-def download_files(agent_manager, file_list: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+def _sniff_mime_type(file_path: str) -> Optional[str]:
+    """
+    Detect a file's MIME type from its leading bytes.
+
+    Only common binary signatures and JSON documents are recognized; other
+    content returns None so callers fall back to the metadata-based guess.
+    Content is treated as JSON only if the whole file parses as JSON.
+
+    Args:
+        file_path: Path to the downloaded file
+
+    Returns:
+        str: MIME type string, or None if the content is not recognized
+    """
+    try:
+        with open(file_path, 'rb') as f:
+            head = f.read(_SNIFF_BYTES)
+            for signature, mime_type in _MIME_SIGNATURES:
+                if head.startswith(signature):
+                    return mime_type
+
+            if head.lstrip(b'\xef\xbb\xbf \t\r\n')[:1] not in (b'{', b'['):
+                return None
+            # Text starting with a bracket isn't necessarily JSON; parse it to be sure
+            content = head + f.read(max(_JSON_SNIFF_MAX_BYTES + 1 - len(head), 0))
+    except OSError as e:
+        logger.error("Error sniffing file %s: %s", file_path, e)
+        return None
+
+    if len(content) > _JSON_SNIFF_MAX_BYTES:
+        return None
+    try:
+        json.loads(content)
+    except ValueError:
+        return None
+    return 'application/json'
+
+
+def _attempt_download(agent_manager, file_info: FileInfo, local_path: Path) -> FileInfo:
+    """
+    Download a single file and describe the outcome.
+
+    Args:
+        agent_manager: AzureAgentManager instance
+        file_info: File information dictionary with a 'file_id'
+        local_path: Path where the file should be saved
+
+    Returns:
+        Dictionary with file information including the local path on success
+    """
+    file_id = file_info['file_id']
+    local_str = str(local_path)
+    try:
+        # Download the file
+        success = agent_manager.download_file(file_id, local_str)
+
+        if success:
+            # Sniff once here so later renders don't rely on the text heuristic
+            mime_type = _sniff_mime_type(local_str)
+
+            # Make the file name agree with the detected content type
+            extension = _EXT_BY_MIME.get(mime_type)
+            if extension and _MIME_TABLE.get(local_path.suffix) != mime_type:
+                renamed_path = local_path.with_suffix(extension)
+                try:
+                    os.replace(local_str, renamed_path)
+                    local_path, local_str = renamed_path, str(renamed_path)
+                except OSError as e:
+                    logger.error("Error renaming file %s: %s", local_str, e)
+
+            result = {
+                **file_info,
+                'local_path': local_str,
+                'file_name': local_path.name,
+                'success': True
+            }
+            if mime_type:
+                result['mime_type'] = mime_type
+                result['extension'] = local_path.suffix
+            return result
+        return {
+            **file_info,
+            'success': False,
+            'error': 'Download failed'
+        }
+
+    except Exception as e:
+        logger.error("Error downloading file %s: %s", file_id, e)
+        return {
+            **file_info,
+            'success': False,
+            'error': str(e)
+        }
+
+
+def _write_lru_index():
+    """
+    Rewrite the LRU index file in compacted form (one line per tracked file).
+
+    Must be called with _lru_lock held.
+    """
+    global _lru_index_lines
+    try:
+        with open(_LRU_INDEX_TMP_FILE, 'w', encoding='utf-8') as f:
+            f.writelines(f"{path}\t{timestamp}\n" for path, timestamp in _lru_index.items())
+        os.replace(_LRU_INDEX_TMP_FILE, _LRU_INDEX_FILE)
+        _lru_index_lines = len(_lru_index)
+    except OSError as e:
+        logger.error("Error writing download index: %s", e)
+
+
+def _load_lru_index():
+    """
+    Load the LRU index once per process and reconcile it with the downloads
+    directory.
+
+    Files missing from the index (no index yet, an unreadable index, or a
+    failed append) are added by modification time, and entries whose files
+    are gone are dropped, so every file on disk remains eligible for eviction.
+
+    Must be called with _lru_lock held.
+    """
+    global _lru_index_lines, _lru_index_loaded
+    if _lru_index_loaded:
+        return
+    _lru_index_loaded = True
+
+    indexed = {}
+    lines = 0
+    try:
+        with open(_LRU_INDEX_FILE, encoding='utf-8') as f:
+            for line in f:
+                lines += 1
+                path, _, timestamp = line.rstrip('\n').rpartition('\t')
+                try:
+                    indexed[path] = float(timestamp)
+                except ValueError:
+                    continue  # Skip a torn or corrupted line
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.error("Error reading download index, rebuilding it from the directory: %s", e)
+
+    try:
+        with os.scandir(DOWNLOADS_DIR) as entries:
+            present = {
+                entry.path: entry.stat().st_mtime
+                for entry in entries
+                if entry.is_file() and not entry.name.startswith('.')
+            }
+    except FileNotFoundError:
+        present = {}
+
+    # Keep recorded download times; fall back to mtime for untracked files
+    merged = {path: indexed.get(path, mtime) for path, mtime in present.items()}
+    _lru_index.clear()
+    _lru_index.update(sorted(merged.items(), key=lambda item: item[1]))
+    _lru_index_lines = lines
+
+    # Rewrite unless the file already lists exactly these entries once each
+    if lines != len(_lru_index) or merged.keys() != indexed.keys():
+        _write_lru_index()
+
+
+def _record_downloads(paths: List[str]):
+    """
+    Add newly downloaded files to the LRU index.
+
+    Args:
+        paths: Local paths of the downloaded files
+    """
+    global _lru_index_lines
+    if not paths:
+        return
+
+    with _lru_lock:
+        _load_lru_index()
+        timestamp = time.time()
+        for path in paths:
+            _lru_index[path] = timestamp
+            _lru_index.move_to_end(path)
+
+        try:
+            with open(_LRU_INDEX_FILE, 'a', encoding='utf-8') as f:
+                f.writelines(f"{path}\t{timestamp}\n" for path in paths)
+            _lru_index_lines += len(paths)
+        except OSError as e:
+            logger.error("Error updating download index: %s", e)
+
+        # Compact once re-downloads have left the log twice as long as the index
+        if _lru_index_lines > 2 * len(_lru_index):
+            _write_lru_index()
+
+
+def download_files(agent_manager, file_list: List[FileInfo]) -> List[FileInfo]:
     """
     Download multiple files from the agent.
 
+    Downloads are independent network requests, so they are issued concurrently;
+    results are returned in the same order as file_list, with one result per
+    file ID.
+
     Args:
         agent_manager: AzureAgentManager instance
         file_list: List of file information dictionaries
@@ -85,46 +387,52 @@ def download_files(agent_manager, file_list: List[Dict[str, Any]]) -> List[Dict[
     Returns:
         List of dictionaries with file information including local paths
     """
-    downloaded_files = []
-
+    # A reply can reference the same file several times; download each ID once
+    # (keeping the first entry) so concurrent workers never share a local path
+    files_by_id = {}
     for file_info in file_list:
-        file_id = file_info.get('file_id')
-        if not file_id:
-            continue
+        if file_info.get('file_id'):
+            files_by_id.setdefault(file_info['file_id'], file_info)
+    files_to_download = list(files_by_id.values())
+    if not files_to_download:
+        return []
 
-        try:
-            # Generate local path
-            local_path = generate_file_path(file_id, file_info)
-
-            # Download the file
-            success = agent_manager.download_file(file_id, str(local_path))
-
-            if success and local_path.exists():
-                downloaded_files.append({
-                    **file_info,
-                    'local_path': str(local_path),
-                    'file_name': local_path.name,
-                    'success': True
-                })
-            else:
-                downloaded_files.append({
-                    **file_info,
-                    'success': False,
-                    'error': 'Download failed'
-                })
-
-        except Exception as e:
-            print(f"Error downloading file {file_id}: {str(e)}")
-            downloaded_files.append({
-                **file_info,
-                'success': False,
-                'error': str(e)
-            })
+    # Resolve every local path up front so worker threads only do network I/O
+    try:
+        ensure_downloads_directory()
+        local_paths = [
+            generate_file_path(file_info['file_id'], file_info)
+            for file_info in files_to_download
+        ]
+    except Exception as e:
+        logger.error("Error preparing downloads: %s", e)
+        return [
+            {**file_info, 'success': False, 'error': str(e)}
+            for file_info in files_to_download
+        ]
+
+    # Load the LRU index before new files land so they are recorded exactly once
+    with _lru_lock:
+        _load_lru_index()
+
+    max_workers = min(MAX_DOWNLOAD_WORKERS, len(files_to_download))
+
+    # executor.map runs the downloads concurrently and yields results in input order
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        downloaded_files = list(executor.map(
+            functools.partial(_attempt_download, agent_manager),
+            files_to_download,
+            local_paths
+        ))
+
+    _record_downloads([
+        file_info['local_path'] for file_info in downloaded_files if file_info['success']
+    ])
 
     return downloaded_files
 
 
-def get_file_display_name(file_info: Dict[str, Any]) -> str:
+def get_file_display_name(file_info: FileInfo) -> str:
     """
     Get a user-friendly display name for a file.
 
@@ -142,9 +450,14 @@ def get_file_display_name(file_info: Dict[str, Any]) -> str:
         # Try to extract name from annotation text
         text = file_info.get('text', '')
         if text:
-            # Extract filename from text if present
-            if '/' in text or '\\' in text:
-                return Path(text).name
+            # Extract filename from text if present (after the last / or \\),
+            # ignoring trailing separators such as in "sandbox:/mnt/data/"
+            path = text.rstrip('/\\')
+            separator_index = max(path.rfind('/'), path.rfind('\\'))
+            if separator_index >= 0:
+                return path[separator_index + 1:]
+            if path != text:
+                return path or "Generated File"
             return f"Data File ({text})"
         return "Generated File"
 
@@ -155,28 +468,33 @@ def cleanup_old_files(max_files: int = 50):
     """
     Clean up old files in the downloads directory to prevent unlimited growth.
 
+    Files are evicted oldest-first from the LRU index, so the directory is not
+    rescanned on every call.
+
     Args:
         max_files: Maximum number of files to keep
     """
     try:
-        if not DOWNLOADS_DIR.exists():
-            return
-
-        # Get all files sorted by modification time
-        files = sorted(DOWNLOADS_DIR.glob("*"), key=lambda x: x.stat().st_mtime)
-
-        # Remove oldest files if we exceed max_files
-        if len(files) > max_files:
-            files_to_remove = files[:len(files) - max_files]
-            for file_path in files_to_remove:
+        with _lru_lock:
+            _load_lru_index()
+            if len(_lru_index) <= max_files:
+                return
+
+            # Remove oldest files (front of the LRU index) until within max_files
+            while len(_lru_index) > max_files:
+                file_path, _ = _lru_index.popitem(last=False)
                 try:
-                    file_path.unlink()
-                    print(f"Removed old file: {file_path.name}")
+                    os.unlink(file_path)
+                    logger.info("Removed old file: %s", os.path.basename(file_path))
+                except FileNotFoundError:
+                    pass  # Already gone
                 except Exception as e:
-                    print(f"Error removing file {file_path}: {str(e)}")
+                    logger.error("Error removing file %s: %s", file_path, e)
+
+            _write_lru_index()
 
     except Exception as e:
-        print(f"Error during cleanup: {str(e)}")
+        logger.error("Error during cleanup: %s", e)
 
 
 def read_file_bytes(file_path: str) -> Optional[bytes]:
@@ -193,11 +511,11 @@ def read_file_bytes(file_path: str) -> Optional[bytes]:
         with open(file_path, 'rb') as f:
             return f.read()
     except Exception as e:
-        print(f"Error reading file {file_path}: {str(e)}")
+        logger.error("Error reading file %s: %s", file_path, e)
         return None
 
 
-def get_mime_type(file_info: Dict[str, Any]) -> str:
+def get_mime_type(file_info: FileInfo) -> str:
     """
     Get the MIME type for a file.
 
@@ -207,18 +525,9 @@ def get_mime_type(file_info: Dict[str, Any]) -> str:
     Returns:
         str: MIME type string
     """
-    file_type = file_info.get('type', 'file')
-    extension = get_file_extension(file_info)
-
-    if file_type == 'image' or extension == '.png':
+    # Prefer the type detected from the downloaded content
+    if file_info.get('mime_type'):
+        return file_info['mime_type']
+    if file_info.get('type', 'file') == 'image':
         return 'image/png'
-    elif extension == '.jpg' or extension == '.jpeg':
-        return 'image/jpeg'
-    elif extension == '.csv':
-        return 'text/csv'
-    elif extension == '.json':
-        return 'application/json'
-    elif extension == '.txt':
-        return 'text/plain'
-    else:
-        return 'application/octet-stream'
+    return _MIME_TABLE.get(get_file_extension(file_info), 'application/octet-stream')
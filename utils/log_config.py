@@ -0,0 +1,36 @@
+"""
+Logging setup for the Streamlit app.
+
+Modules under utils/ only create module-level loggers; the app calls
+configure_logging() once at startup to decide where their records go.
+"""
+
+import atexit
+import functools
+import logging
+import logging.handlers
+import queue
+
+
+@functools.lru_cache(maxsize=1)
+def configure_logging():
+    """
+    Show INFO records from the utils package, written by a background thread.
+
+    If the root logger has no handlers yet, a QueueHandler is installed on it:
+    callers (including download worker threads) only enqueue records and a
+    QueueListener thread performs the stream writes. Existing root handlers are
+    left alone. Records keep propagating, so any other logging configuration
+    still sees them.
+    """
+    logging.getLogger("utils").setLevel(logging.INFO)
+
+    root = logging.getLogger()
+    if root.handlers:
+        return
+
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, logging.StreamHandler())
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    listener.start()
+    atexit.register(listener.stop)
@@ -0,0 +1,106 @@
+"""
+Persistence for conversation thread IDs.
+
+Thread IDs are stored in a small SQLite database keyed by a per-browser
+session key, so a user reconnecting after an app restart continues on the
+same Azure thread instead of starting a new conversation. Sessions idle
+for longer than SESSION_TTL_SECONDS are forgotten and pruned.
+"""
+
+import logging
+import os
+import sqlite3
+import time
+from contextlib import closing
+from typing import Optional
+
+
+# Default location of the session database (override with SESSION_DB_PATH)
+DEFAULT_SESSION_DB_PATH = "sessions.db"
+
+# Sessions not used for this long are expired (30 days)
+SESSION_TTL_SECONDS = 30 * 24 * 60 * 60
+
+logger = logging.getLogger(__name__)
+
+
+def _connect() -> sqlite3.Connection:
+    """
+    Open the session database, creating the threads table if needed.
+
+    Returns:
+        sqlite3.Connection: Open connection to the session database
+    """
+    conn = sqlite3.connect(os.environ.get("SESSION_DB_PATH", DEFAULT_SESSION_DB_PATH))
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS threads ("
+        "session_key TEXT PRIMARY KEY, "
+        "thread_id TEXT NOT NULL, "
+        "updated_at REAL NOT NULL)"
+    )
+    return conn
+
+
+def load_thread_id(session_key: str) -> Optional[str]:
+    """
+    Look up the thread ID stored for a session and mark the session as used.
+
+    Args:
+        session_key: Per-browser session key
+
+    Returns:
+        str: Stored thread ID, or None if there is none, it has expired, or on error
+    """
+    now = time.time()
+    try:
+        with closing(_connect()) as conn, conn:
+            row = conn.execute(
+                "SELECT thread_id FROM threads WHERE session_key = ? AND updated_at >= ?",
+                (session_key, now - SESSION_TTL_SECONDS)
+            ).fetchone()
+            if row:
+                conn.execute(
+                    "UPDATE threads SET updated_at = ? WHERE session_key = ?",
+                    (now, session_key)
+                )
+        return row[0] if row else None
+    except sqlite3.Error as e:
+        logger.error("Error loading thread for session: %s", e)
+        return None
+
+
+def save_thread_id(session_key: str, thread_id: str):
+    """
+    Store (or replace) the thread ID for a session, pruning expired sessions.
+
+    Args:
+        session_key: Per-browser session key
+        thread_id: Azure OpenAI thread ID
+    """
+    now = time.time()
+    try:
+        with closing(_connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO threads (session_key, thread_id, updated_at) VALUES (?, ?, ?)",
+                (session_key, thread_id, now)
+            )
+            conn.execute(
+                "DELETE FROM threads WHERE updated_at < ?",
+                (now - SESSION_TTL_SECONDS,)
+            )
+    except sqlite3.Error as e:
+        logger.error("Error saving thread for session: %s", e)
+
+
+def clear_thread_id(session_key: str):
+    """
+    Forget the thread ID stored for a session.
+
+    Args:
+        session_key: Per-browser session key
+    """
+    try:
+        with closing(_connect()) as conn, conn:
+            conn.execute("DELETE FROM threads WHERE session_key = ?", (session_key,))
+    except sqlite3.Error as e:
+        logger.error("Error clearing thread for session: %s", e)